@@ -1 +1,3 @@
-from .agent import DuelAgent
\ No newline at end of file
+from .agent import DuelAgent
+from .config import AgentConfig, load_config
+from .weights import WeightSubscriber, WeightSyncObserver
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
 import tempfile
-from typing import List
+import time
+from typing import Dict, List, Tuple
 
 import numpy as np
 import tensorflow as tf
@@ -17,7 +18,12 @@ from tf_agents.replay_buffers.reverb_replay_buffer import ReverbReplayBuffer
 from tf_agents.replay_buffers.reverb_utils import ReverbAddTrajectoryObserver
 from tf_agents.train import actor, learner, triggers
 from tf_agents.train.utils import train_utils, spec_utils
+from tf_agents.trajectories.time_step import StepType
 
+from .config import AgentConfig
+from .evaluation import AdaptiveEvaluator
+from .metrics import watchdog_metrics, session_metrics, shortcut_metrics
+from .weights import WeightPublisher, WeightPublishTrigger
 from ..environment import YGOEnvironment
 
 tempdir: str = tempfile.gettempdir()
@@ -25,8 +31,6 @@ tempdir: str = tempfile.gettempdir()
 _initial_collect_episodes = 10 # @param {type:"integer"}
 _replay_buffer_capacity = 10000 # @param {type:"integer"}
 
-_batch_size = 256 # @param {type:"integer"}
-
 _log_interval = 500 # @param {type:"integer"}
 
 _num_eval_episodes = 5 # @param {type:"integer"}
@@ -37,54 +41,78 @@ _policy_save_interval = 5000 # @param {type:"integer"}
 
 class DuelAgent:
     """ Duel agent with SAC algorithm """
-    def __init__(self, collect_env: YGOEnvironment, eval_env: YGOEnvironment) -> None:
+    def __init__(self, collect_env: YGOEnvironment, eval_env: YGOEnvironment, config: AgentConfig=AgentConfig(), extra_eval_envs: List[YGOEnvironment]=()) -> None:
         self._collect_env: YGOEnvironment = collect_env
         self._eval_env: YGOEnvironment = eval_env
         
         # hyper parameters
-        self._actor_fc_layer_params: List[int] = [256, 256]
-        self._critic_joint_fc_layer_params: List[int] = [256, 256]
-        self._critic_learning_rate: float = 3e-4
-        self._actor_learning_rate: float = 3e-4
-        self._alpha_learning_rate: float = 3e-4
-        self._target_update_tau: float = 0.005
-        self._target_update_period: int = 1
-        self._gamma: float = 0.99
-        self._reward_scale_factor: float = 1.0
+        self._config: AgentConfig = config
         table_name: str = 'uniform_table'
+        self._table_name: str = table_name
 
         # Agent
         train_step = train_utils.create_train_step()
-        self._agent: SacAgent = _create_agent(self, train_step)
+        observation_spec, action_spec, time_step_spec = spec_utils.get_tensor_specs(self._collect_env)
+        self._agent: SacAgent = _create_agent(observation_spec, action_spec, time_step_spec, config, train_step)
         # reverb
-        self._reverb_server: reverb.Server = _create_reverb_server(table_name)
-        self._reverb_replay_buffer: ReverbReplayBuffer = _create_replay_buffer(self._agent.collect_data_spec, self._reverb_server, table_name)
+        self._reverb_server: reverb.Server = _create_reverb_server(table_name, config.replay_chunk_length)
+        self._reverb_replay_buffer: ReverbReplayBuffer = _create_replay_buffer(self._agent.collect_data_spec, self._reverb_server, table_name, config.replay_chunk_length)
         # policy
         self._eval_policy: PyTFEagerPolicy = PyTFEagerPolicy(self._agent.policy, use_tf_function=True)
         self._collect_policy: PyTFEagerPolicy = PyTFEagerPolicy(self._agent.collect_policy, use_tf_function=True)
         # actor
-        self._rb_observer: ReverbAddTrajectoryObserver = _create_rb_observer(self._reverb_replay_buffer, table_name)
+        self._rb_observer: ReverbAddTrajectoryObserver = _create_rb_observer(self._reverb_replay_buffer, table_name, config.replay_chunk_length)
         self._collect_actor: actor.Actor = _create_collect_actor(self._collect_env, self._collect_policy, train_step, self._rb_observer)
         self._eval_actor: actor.Actor = _create_eval_actor(self._eval_env, self._eval_policy, train_step)
+        self._adaptive_evaluator: AdaptiveEvaluator = None
+        if config.adaptive_eval:
+            self._adaptive_evaluator = AdaptiveEvaluator(
+                [eval_env, *extra_eval_envs],
+                self._eval_policy,
+                config.eval_min_episodes,
+                config.eval_max_episodes,
+                config.eval_max_width,
+                config.eval_confidence,
+                train_step,
+                os.path.join(tempdir, 'eval')
+            )
         # learner
-        self._agent_learner: learner.Learner = _create_agent_learner(self._agent, train_step, self._reverb_replay_buffer)
+        self._weight_publisher: WeightPublisher = None
+        learning_triggers = []
+        if config.weight_channel is not None:
+            self._weight_publisher = WeightPublisher(config.weight_channel, self._agent.collect_policy.variables())
+            learning_triggers.append(WeightPublishTrigger(self._weight_publisher, train_step, config.weight_publish_interval))
+        self._agent_learner: learner.Learner = _create_agent_learner(self._agent, train_step, self._reverb_replay_buffer, config, learning_triggers)
+        # wall time spent in each phase of train(). first_train_step is counted from the start of train()
+        self.timings: Dict[str, float] = {'collect': 0.0, 'train': 0.0, 'eval': 0.0, 'first_train_step': 0.0, 'first_learner_run': 0.0}
 
 
     def train(self, iterations: int) -> None:
         self._agent.train_step_counter.assign(0)
+        started = time.time()
 
-        returns = [_get_eval_metrics(self._eval_actor)['AverageReturn']]
+        returns = [self._evaluate()['AverageReturn']]
+        self.timings['eval'] += time.time() - started
 
-        for _ in range(iterations):
+        for i in range(iterations):
+            t0 = time.time()
             self._collect_actor.run()
+            t1 = time.time()
             loss_info = self._agent_learner.run(iterations=1)
+            t2 = time.time()
+            self.timings['collect'] += t1 - t0
+            self.timings['train'] += t2 - t1
+            if i == 0:
+                self.timings['first_train_step'] = t2 - started
+                self.timings['first_learner_run'] = t2 - t1
 
             step = int(self._agent_learner.train_step_numpy)
 
             if step % _eval_interval == 0:
-                metrics = _get_eval_metrics(self._eval_actor)
+                metrics = self._evaluate()
                 _log_eval_metrics(step, metrics)
                 returns.append(metrics['AverageReturn'])
+                self.timings['eval'] += time.time() - t2
 
             if step % _log_interval == 0:
                 print(f'step = {step}: loss = {loss_info.loss.numpy()}')
@@ -93,20 +121,29 @@ class DuelAgent:
         #self._reverb_server.stop()
 
 
-def _create_agent(agent: DuelAgent, train_step) -> SacAgent:
-    observation_spec, action_spec, time_step_spec = spec_utils.get_tensor_specs(agent._collect_env)
+    def _evaluate(self) -> dict:
+        if self._adaptive_evaluator is not None:
+            return self._adaptive_evaluator.evaluate()
+        return _get_eval_metrics(self._eval_actor)
+
+
+    def close(self) -> None:
+        if self._weight_publisher is not None:
+            self._weight_publisher.close()
 
+
+def _create_agent(observation_spec, action_spec, time_step_spec, config: AgentConfig, train_step) -> SacAgent:
     critic_net = critic_network.CriticNetwork(
         (observation_spec, action_spec),
         observation_fc_layer_params=None,
         action_fc_layer_params=None,
-        joint_fc_layer_params=agent._critic_joint_fc_layer_params,
+        joint_fc_layer_params=config.critic_joint_fc_layer_params,
     )
 
     actor_net = actor_distribution_network.ActorDistributionNetwork(
         observation_spec,
         action_spec,
-        fc_layer_params=agent._actor_fc_layer_params,
+        fc_layer_params=config.actor_fc_layer_params,
         continuous_projection_net=TanhNormalProjectionNetwork
     )
 
@@ -115,25 +152,45 @@ def _create_agent(agent: DuelAgent, train_step) -> SacAgent:
         action_spec,
         actor_network=actor_net,
         critic_network=critic_net,
-        actor_optimizer=tf.compat.v1.train.AdamOptimizer(learning_rate=agent._actor_learning_rate),
-        critic_optimizer=tf.compat.v1.train.AdamOptimizer(learning_rate=agent._critic_learning_rate),
-        alpha_optimizer=tf.compat.v1.train.AdamOptimizer(learning_rate=agent._alpha_learning_rate),
-        target_update_tau=agent._target_update_tau,
-        target_update_period=agent._target_update_period,
+        actor_optimizer=tf.compat.v1.train.AdamOptimizer(learning_rate=config.actor_learning_rate),
+        critic_optimizer=tf.compat.v1.train.AdamOptimizer(learning_rate=config.critic_learning_rate),
+        alpha_optimizer=tf.compat.v1.train.AdamOptimizer(learning_rate=config.alpha_learning_rate),
+        target_update_tau=config.target_update_tau,
+        target_update_period=config.target_update_period,
         td_errors_loss_fn=tf.math.squared_difference,
-        gamma=agent._gamma,
-        reward_scale_factor=agent._reward_scale_factor,
+        gamma=config.gamma,
+        reward_scale_factor=config.reward_scale_factor,
         train_step_counter=train_step
     )
     tf_agent.initialize()
 
+    if config.use_xla:
+        # compile the losses (and so their gradients) only. SacAgent._train writes summaries,
+        # which have no XLA kernel, and the optimizers create their slot variables on first apply
+        for loss in ('critic_loss', 'actor_loss', 'alpha_loss'):
+            setattr(tf_agent, loss, tf.function(getattr(tf_agent, loss), jit_compile=True))
+
     return tf_agent
 
 
-def _create_reverb_server(table_name: str) -> reverb.Server:
+def _sequence_layout(chunk_length: int) -> Tuple[int, int]:
+    """ (sequence_length, stride_length) of items written to reverb
+
+    None stores every transition as its own 2-step item. Otherwise items are chunks
+    overlapping by one step, split into transitions at sample time.
+    """
+    if chunk_length is None:
+        return 2, 1
+    if chunk_length < 2:
+        raise ValueError(f'replay_chunk_length must be at least 2: {chunk_length}')
+    return chunk_length, chunk_length - 1
+
+
+def _create_reverb_server(table_name: str, chunk_length: int) -> reverb.Server:
+    _, stride_length = _sequence_layout(chunk_length)
     table = reverb.Table(
         table_name,
-        max_size=_replay_buffer_capacity,
+        max_size=_replay_buffer_capacity // stride_length,
         sampler=reverb.selectors.Uniform(),
         remover=reverb.selectors.Fifo(),
         rate_limiter=reverb.rate_limiters.MinSize(1)
@@ -141,21 +198,48 @@ def _create_reverb_server(table_name: str) -> reverb.Server:
     return reverb.Server([table])
 
 
-def _create_replay_buffer(collect_data_spec, reverb_server: reverb.Server, table_name: str) -> ReverbReplayBuffer:
+def _create_replay_buffer(collect_data_spec, reverb_server: reverb.Server, table_name: str, chunk_length: int) -> ReverbReplayBuffer:
+    sequence_length, _ = _sequence_layout(chunk_length)
     return ReverbReplayBuffer(
         collect_data_spec,
-        sequence_length=2,
+        sequence_length=sequence_length,
         table_name=table_name,
         local_server=reverb_server
     )
 
 
-def _create_rb_observer(reverb_replay_buffer: ReverbReplayBuffer, table_name: str) -> ReverbAddTrajectoryObserver:
+class _ChunkObserver(ReverbAddTrajectoryObserver):
+    """ writes overlapping chunks, padding the end of every episode just up to the next chunk boundary
+
+    pad_end_of_episodes alone only pads episodes shorter than a chunk, so the tail of a
+    longer episode, including its terminal transition, would never be written. Chunks
+    stay stride aligned, so no transition is written twice. The padding steps are
+    boundaries and are dropped by _split_transitions.
+    """
+    def __init__(self, py_client, table_name: str, chunk_length: int) -> None:
+        sequence_length, stride_length = _sequence_layout(chunk_length)
+        super().__init__(py_client, table_name, sequence_length=sequence_length, stride_length=stride_length, pad_end_of_episodes=True)
+
+
+    def reset(self, write_cached_steps: bool=True) -> None:
+        if write_cached_steps and self._last_trajectory is not None:
+            padding_step = self._get_padding_step(self._last_trajectory)
+            while not self._sequence_lengths_reached():
+                self._writer.append(padding_step)
+                self._cached_steps += 1
+                self._write_cached_steps()
+        super().reset(write_cached_steps=False)
+
+
+def _create_rb_observer(reverb_replay_buffer: ReverbReplayBuffer, table_name: str, chunk_length: int) -> ReverbAddTrajectoryObserver:
+    if chunk_length is not None:
+        return _ChunkObserver(reverb_replay_buffer.py_client, table_name, chunk_length)
+    sequence_length, stride_length = _sequence_layout(chunk_length)
     return ReverbAddTrajectoryObserver(
         reverb_replay_buffer.py_client,
         table_name,
-        sequence_length=2,
-        stride_length=1
+        sequence_length=sequence_length,
+        stride_length=stride_length
     )
 
 
@@ -176,7 +260,7 @@ def _create_collect_actor(collect_env: YGOEnvironment, collect_policy: PyTFEager
         collect_policy,
         train_step,
         episodes_per_run=1,
-        metrics=actor.collect_metrics(10),
+        metrics=actor.collect_metrics(10) + watchdog_metrics(collect_env) + session_metrics(collect_env) + shortcut_metrics(collect_env),
         summary_dir=os.path.join(tempdir, learner.TRAIN_DIR),
         observers=[rb_observer, py_metrics.EnvironmentSteps()]
     )
@@ -193,8 +277,28 @@ def _create_eval_actor(eval_env: YGOEnvironment, eval_policy: PyTFEagerPolicy, t
     )
 
 
-def _create_agent_learner(tf_agent, train_step, reverb_replay_buffer: ReverbReplayBuffer) -> learner.Learner:
-    learning_triggers = [
+def _split_transitions(experience, sample_info) -> tf.data.Dataset:
+    """ cut a chunk of steps into overlapping 2-step transitions, dropping those across an episode end """
+    transitions = tf.nest.map_structure(lambda t: tf.stack([t[:-1], t[1:]], axis=1), experience)
+    valid = tf.not_equal(experience.next_step_type[:-1], StepType.FIRST)
+    transitions = tf.nest.map_structure(lambda t: tf.boolean_mask(t, valid), transitions)
+    return tf.data.Dataset.from_tensor_slices(transitions)
+
+
+def _create_experience_dataset(reverb_replay_buffer: ReverbReplayBuffer, batch_size: int, chunk_length: int) -> tf.data.Dataset:
+    if chunk_length is None:
+        return reverb_replay_buffer.as_dataset(sample_batch_size=batch_size, num_steps=2).prefetch(50)
+
+    return reverb_replay_buffer.as_dataset(num_steps=chunk_length) \
+        .flat_map(_split_transitions) \
+        .shuffle(batch_size * 4) \
+        .batch(batch_size, drop_remainder=True) \
+        .map(lambda experience: (experience, ())) \
+        .prefetch(50)
+
+
+def _create_agent_learner(tf_agent, train_step, reverb_replay_buffer: ReverbReplayBuffer, config: AgentConfig, extra_triggers: list) -> learner.Learner:
+    learning_triggers = extra_triggers + [
         triggers.PolicySavedModelTrigger(
             os.path.join(tempdir, learner.POLICY_SAVED_MODEL_DIR),
             tf_agent,
@@ -208,7 +312,7 @@ def _create_agent_learner(tf_agent, train_step, reverb_replay_buffer: ReverbRepl
         tempdir,
         train_step,
         tf_agent,
-        lambda: reverb_replay_buffer.as_dataset(sample_batch_size=_batch_size, num_steps=2).prefetch(50),
+        lambda: _create_experience_dataset(reverb_replay_buffer, config.batch_size, config.replay_chunk_length),
         triggers=learning_triggers
     )
 
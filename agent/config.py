@@ -0,0 +1,42 @@
+import json
+from typing import NamedTuple, Tuple
+
+
+class AgentConfig(NamedTuple):
+    """ hyper parameters of DuelAgent """
+    actor_fc_layer_params: Tuple[int, ...] = (256, 256)
+    critic_joint_fc_layer_params: Tuple[int, ...] = (256, 256)
+    critic_learning_rate: float = 3e-4
+    actor_learning_rate: float = 3e-4
+    alpha_learning_rate: float = 3e-4
+    target_update_tau: float = 0.005
+    target_update_period: int = 1
+    gamma: float = 0.99
+    reward_scale_factor: float = 1.0
+    batch_size: int = 256
+    use_xla: bool = False
+    weight_channel: str = None # shared memory name to publish policy weights to collectors. None disables it
+    weight_publish_interval: int = 100
+    weight_sync_interval: int = 100
+    replay_chunk_length: int = None # steps per reverb item. None writes every transition as its own 2-step item
+    adaptive_eval: bool = False # evaluate concurrently on eval_clients environments until the win rate is confident
+    eval_clients: int = 1
+    eval_min_episodes: int = 10
+    eval_max_episodes: int = 100
+    eval_max_width: float = 0.2 # width of the win rate confidence interval that is tight enough
+    eval_confidence: float = 0.95
+
+
+def load_config(path: str) -> AgentConfig:
+    """ load AgentConfig from json file. missing keys take default values """
+    with open(path) as f:
+        values: dict = json.load(f)
+
+    unknown = set(values) - set(AgentConfig._fields)
+    if unknown:
+        raise ValueError(f'unknown config keys in {path}: {", ".join(sorted(unknown))}')
+
+    for key in ('actor_fc_layer_params', 'critic_joint_fc_layer_params'):
+        if key in values:
+            values[key] = tuple(values[key])
+    return AgentConfig(**values)
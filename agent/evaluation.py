@@ -0,0 +1,131 @@
+import math
+import statistics
+from threading import Lock, Thread
+from typing import Dict, List, Tuple
+
+import tensorflow as tf
+from tf_agents.policies.py_tf_eager_policy import PyTFEagerPolicy
+
+from ..environment import YGOEnvironment
+
+
+def wilson_interval(wins: int, episodes: int, confidence: float) -> Tuple[float, float]:
+    """ confidence interval of a win rate, usable with few episodes and rates near 0 or 1 """
+    if episodes == 0:
+        return 0.0, 1.0
+    z: float = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    p: float = wins / episodes
+    denominator: float = 1 + z**2 / episodes
+    center: float = (p + z**2 / (2 * episodes)) / denominator
+    margin: float = z * math.sqrt(p * (1 - p) / episodes + z**2 / (4 * episodes**2)) / denominator
+    return max(center - margin, 0.0), min(center + margin, 1.0)
+
+
+class AdaptiveEvaluator:
+    """ plays eval duels on all eval environments at once and stops as soon as the win rate is known well enough
+
+    Evaluation stops when the confidence interval is narrower than max_width, or when it does
+    not overlap the interval of the previous evaluation. Duels truncated by an abort are
+    left out of the win rate and reported as EvalAborted; they still count against
+    max_episodes. Results are written as Metrics/<name>
+    summaries against train_step when summary_dir is given.
+    """
+    def __init__(self, envs: List[YGOEnvironment], policy: PyTFEagerPolicy, min_episodes: int, max_episodes: int, max_width: float, confidence: float,
+                 train_step: tf.Variable=None, summary_dir: str=None) -> None:
+        self._envs: List[YGOEnvironment] = envs
+        self._policy: PyTFEagerPolicy = policy
+        self._policy_lock: Lock = Lock()
+        self._min_episodes: int = min_episodes
+        self._max_episodes: int = max_episodes
+        self._max_width: float = max_width
+        self._confidence: float = confidence
+        self.previous_interval: Tuple[float, float] = None
+        self._lock: Lock = Lock()
+        self._train_step: tf.Variable = train_step
+        self._summary_writer: tf.summary.SummaryWriter = tf.summary.create_file_writer(summary_dir) if summary_dir is not None else None
+
+
+    def evaluate(self) -> Dict[str, float]:
+        self._returns: List[float] = []
+        self._aborted: int = 0
+        self._stopped: bool = False
+        self._running: int = 0
+        threads = [Thread(target=self._run_env, args=(env,)) for env in self._envs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        episodes: int = len(self._returns)
+        wins: int = sum(1 for episode_return in self._returns if episode_return > 0)
+        lower, upper = wilson_interval(wins, episodes, self._confidence)
+        self.previous_interval = (lower, upper)
+        metrics: Dict[str, float] = {
+            'AverageReturn': sum(self._returns) / episodes if episodes else 0.0,
+            'WinRate': wins / episodes if episodes else 0.0,
+            'WinRateLower': lower,
+            'WinRateUpper': upper,
+            'EvalEpisodes': episodes,
+            'EvalAborted': self._aborted,
+        }
+        self._write_summaries(metrics)
+        return metrics
+
+
+    def _write_summaries(self, metrics: Dict[str, float]) -> None:
+        if self._summary_writer is None:
+            return
+        with self._summary_writer.as_default(), tf.summary.record_if(True):
+            for name, value in metrics.items():
+                tf.summary.scalar(f'Metrics/{name}', value, step=self._train_step)
+        self._summary_writer.flush()
+
+
+    def _should_stop(self) -> bool:
+        episodes: int = len(self._returns)
+        if episodes + self._aborted >= self._max_episodes:
+            return True
+        if episodes < self._min_episodes:
+            return False
+        wins: int = sum(1 for episode_return in self._returns if episode_return > 0)
+        lower, upper = wilson_interval(wins, episodes, self._confidence)
+        if upper - lower <= self._max_width:
+            return True
+        if self.previous_interval is None:
+            return False
+        previous_lower, previous_upper = self.previous_interval
+        return lower > previous_upper or upper < previous_lower
+
+
+    def _run_env(self, env: YGOEnvironment) -> None:
+        while True:
+            with self._lock:
+                # episodes already running count against max_episodes
+                if self._stopped or len(self._returns) + self._aborted + self._running >= self._max_episodes:
+                    return
+                self._running += 1
+            try:
+                episode_return, truncated = self._run_episode(env)
+            except Exception:
+                with self._lock:
+                    self._running -= 1
+                raise
+            with self._lock:
+                self._running -= 1
+                if truncated:
+                    self._aborted += 1
+                else:
+                    self._returns.append(episode_return)
+                self._stopped = self._stopped or self._should_stop()
+
+
+    def _run_episode(self, env: YGOEnvironment) -> Tuple[float, bool]:
+        """ (return, whether the duel was truncated by an abort rather than decided) """
+        time_step = env.reset()
+        episode_return: float = 0.0
+        while not time_step.is_last():
+            with self._policy_lock:
+                action = self._policy.action(time_step).action
+            time_step = env.step(action)
+            episode_return += float(time_step.reward)
+        return episode_return, float(time_step.discount) > 0
@@ -0,0 +1,52 @@
+from typing import Callable, List
+
+import numpy as np
+from tf_agents.metrics import py_metric
+
+from .weights import WeightSubscriber
+from ..environment import YGOEnvironment, DuelWatchdog
+
+
+class ValueMetric(py_metric.PyStepMetric):
+    """ reports a value kept outside of trajectories, e.g. by the environment """
+    def __init__(self, name: str, value: Callable[[], float]) -> None:
+        super().__init__(name)
+        self._value: Callable[[], float] = value
+
+
+    def reset(self) -> None:
+        pass
+
+
+    def call(self, trajectory) -> None:
+        pass
+
+
+    def result(self) -> np.float32:
+        return np.float32(self._value())
+
+
+def watchdog_metrics(env: YGOEnvironment) -> List[ValueMetric]:
+    return [
+        ValueMetric('StalledDuels', lambda: env.watchdog.count(DuelWatchdog.STALL)),
+        ValueMetric('CrashedDuels', lambda: env.watchdog.count(DuelWatchdog.CRASH)),
+        ValueMetric('Reconnects', lambda: env.watchdog.count(DuelWatchdog.RECONNECT)),
+    ]
+
+
+def session_metrics(env: YGOEnvironment) -> List[ValueMetric]:
+    return [
+        ValueMetric('DuelSetupLatency', env.session.mean_setup_latency),
+        ValueMetric('ResetWait', env.session.mean_reset_wait),
+    ]
+
+
+def shortcut_metrics(env: YGOEnvironment) -> List[ValueMetric]:
+    return [
+        ValueMetric('SkippedDecisions', lambda: env.session.shortcut.skipped),
+        ValueMetric('SkippedDecisionRatio', env.session.shortcut.skipped_ratio),
+    ]
+
+
+def policy_lag_metric(subscriber: WeightSubscriber) -> ValueMetric:
+    return ValueMetric('PolicyLag', subscriber.policy_lag)
@@ -0,0 +1,142 @@
+""" publish policy variables to collectors in other processes through shared memory
+
+DuelAgent publishes to AgentConfig.weight_channel every weight_publish_interval train steps.
+A collector builds the same networks, attaches a WeightSubscriber to its policy variables,
+adds WeightSyncObserver(subscriber, config.weight_sync_interval) to its actor's observers
+and policy_lag_metric(subscriber) to its metrics. Variables are assigned in place, so
+policies wrapped in tf.function are not retraced.
+"""
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Sequence
+
+import numpy as np
+import tensorflow as tf
+from tf_agents.train import interval_trigger
+
+# header: [sequence, version]. sequence is odd while the learner is writing
+_HEADER_SIZE = 2
+_HEADER_BYTES = _HEADER_SIZE * np.dtype(np.int64).itemsize
+_max_read_retries = 100
+
+
+def _flat_size(variables: Sequence[tf.Variable]) -> int:
+    for variable in variables:
+        if variable.dtype != tf.float32:
+            raise ValueError(f'only float32 variables can be published: {variable.name} is {variable.dtype.name}')
+    return sum(int(np.prod(variable.shape)) for variable in variables)
+
+
+class WeightPublisher:
+    """ writes variables into a versioned flat float32 buffer in shared memory """
+    def __init__(self, name: str, variables: Sequence[tf.Variable]) -> None:
+        self._variables: List[tf.Variable] = list(variables)
+        size: int = _flat_size(self._variables)
+        nbytes: int = _HEADER_BYTES + size * np.dtype(np.float32).itemsize
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        except FileExistsError:
+            # left over by a learner that did not exit cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        self._header: np.ndarray = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=self._shm.buf)
+        self._data: np.ndarray = np.ndarray((size,), dtype=np.float32, buffer=self._shm.buf, offset=_HEADER_BYTES)
+        self._header[:] = (0, -1)
+
+
+    def publish(self, version: int) -> None:
+        flat = np.concatenate([variable.numpy().ravel() for variable in self._variables])
+        self._header[0] += 1
+        self._data[:] = flat
+        self._header[1] = version
+        self._header[0] += 1
+
+
+    def close(self) -> None:
+        self._header = self._data = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+class WeightSubscriber:
+    """ copies the latest published weights into local variables """
+    def __init__(self, name: str, variables: Sequence[tf.Variable]) -> None:
+        self._variables: List[tf.Variable] = list(variables)
+        size: int = _flat_size(self._variables)
+        self._shm = shared_memory.SharedMemory(name=name)
+        # the publisher owns the segment. don't let this process's resource tracker unlink it at exit
+        resource_tracker.unregister(self._shm._name, 'shared_memory')
+        if self._shm.size < _HEADER_BYTES + size * np.dtype(np.float32).itemsize:
+            raise ValueError(f'shared memory {name} is smaller than the given variables')
+        self._header: np.ndarray = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=self._shm.buf)
+        self._data: np.ndarray = np.ndarray((size,), dtype=np.float32, buffer=self._shm.buf, offset=_HEADER_BYTES)
+        self.version: int = -1
+
+
+    @property
+    def latest_version(self) -> int:
+        return int(self._header[1])
+
+
+    def policy_lag(self) -> int:
+        """ learner steps between the published weights and the weights in use """
+        latest: int = max(self.latest_version, 0)
+        return max(latest - max(self.version, 0), 0)
+
+
+    def update(self) -> bool:
+        """ returns True if newer weights were loaded """
+        for _ in range(_max_read_retries):
+            sequence = int(self._header[0])
+            if sequence % 2 == 1:
+                time.sleep(0)
+                continue
+            version = int(self._header[1])
+            if version < 0 or version == self.version:
+                return False
+            flat: np.ndarray = self._data.copy()
+            if int(self._header[0]) == sequence:
+                break
+        else:
+            return False
+
+        offset = 0
+        for variable in self._variables:
+            size = int(np.prod(variable.shape))
+            variable.assign(flat[offset:offset+size].reshape(variable.shape))
+            offset += size
+        self.version = version
+        return True
+
+
+    def close(self) -> None:
+        self._header = self._data = None
+        self._shm.close()
+
+
+class WeightPublishTrigger(interval_trigger.IntervalTrigger):
+    """ learner trigger publishing weights versioned by train step """
+    def __init__(self, publisher: WeightPublisher, train_step: tf.Variable, interval: int) -> None:
+        self._publisher: WeightPublisher = publisher
+        self._train_step: tf.Variable = train_step
+        super().__init__(interval, self._publish)
+
+
+    def _publish(self) -> None:
+        self._publisher.publish(int(self._train_step.numpy()))
+
+
+class WeightSyncObserver:
+    """ actor observer loading published weights every `interval` environment steps """
+    def __init__(self, subscriber: WeightSubscriber, interval: int) -> None:
+        self._subscriber: WeightSubscriber = subscriber
+        self._interval: int = interval
+        self._steps: int = 0
+
+
+    def __call__(self, trajectory) -> None:
+        self._steps += 1
+        if self._steps % self._interval == 0:
+            self._subscriber.update()
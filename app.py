@@ -1,16 +1,29 @@
+import os
+
 from .util import LaunchInfo, load_args
+from .profiling import ProfileTrigger
 from .environment import YGOEnvironment
-from .agent import DuelAgent
+from .agent import DuelAgent, AgentConfig, load_config
+from .agent.agent import tempdir
 
 
 def main():
     info: LaunchInfo = load_args()
-    collect_env = YGOEnvironment(info.deck, info.host, info.port, info.version, info.name+'_collect')
-    eval_env = YGOEnvironment(info.deck, info.host, info.port+1, info.version, info.name+'_eval')
-    agent = DuelAgent(collect_env, eval_env)
+    ProfileTrigger(os.path.join(tempdir, 'profiles'), control_file=info.profile_file, tf_trace=info.profile_tf).install()
+    collect_env = YGOEnvironment(info.deck, info.host, info.port, info.version, info.name+'_collect', shortcut=info.shortcut, stall_timeout=info.stall_timeout, setup_timeout=info.setup_timeout)
+    eval_env = YGOEnvironment(info.deck, info.host, info.port+1, info.version, info.name+'_eval', shortcut=info.shortcut, stall_timeout=info.stall_timeout, setup_timeout=info.setup_timeout)
+    config = load_config(info.config) if info.config is not None else AgentConfig()
+    extra_eval_envs = [
+        YGOEnvironment(info.deck, info.host, info.port+1+i, info.version, info.name+f'_eval{i}', shortcut=info.shortcut, stall_timeout=info.stall_timeout, setup_timeout=info.setup_timeout)
+        for i in range(1, config.eval_clients if config.adaptive_eval else 1)
+    ]
+    agent = DuelAgent(collect_env, eval_env, config, extra_eval_envs)
     agent.train(10000)
+    agent.close()
     collect_env.close()
     eval_env.close()
+    for env in extra_eval_envs:
+        env.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+""" learner throughput benchmark
+
+Trains SacAgent on synthetic experience and reports learner steps/s for each agent config.
+
+    python -m <package>.benchmarks.learner --state-size 1024 configs/default.json configs/xla.json
+"""
+import argparse
+import json
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.specs import array_spec, tensor_spec
+from tf_agents.train import learner
+from tf_agents.train.utils import train_utils
+from tf_agents.trajectories import time_step as ts
+
+from ..agent.agent import _create_agent
+from ..agent.config import AgentConfig, load_config
+
+
+def create_specs(state_size: int):
+    """ tensor specs shaped like YGOEnvironment's """
+    action_spec = array_spec.BoundedArraySpec(shape=(1,), dtype=np.float32, minimum=-1, maximum=1, name='action')
+    observation_spec = array_spec.BoundedArraySpec(shape=(state_size,), dtype=np.float32, minimum=0, maximum=1, name='observation')
+    time_step_spec = ts.time_step_spec(observation_spec)
+    return tuple(tensor_spec.from_spec(spec) for spec in (observation_spec, action_spec, time_step_spec))
+
+
+def benchmark_learner(config: AgentConfig, state_size: int, iterations: int, warmup: int) -> dict:
+    observation_spec, action_spec, time_step_spec = create_specs(state_size)
+    train_step = train_utils.create_train_step()
+    tf_agent = _create_agent(observation_spec, action_spec, time_step_spec, config, train_step)
+
+    experience = tensor_spec.sample_spec_nest(tf_agent.collect_data_spec, outer_dims=(config.batch_size, 2))
+    # unbounded specs sample the whole float range, which overflows the critic loss
+    shape = (config.batch_size, 2)
+    experience = experience._replace(
+        step_type=tf.fill(shape, ts.StepType.MID),
+        next_step_type=tf.fill(shape, ts.StepType.MID),
+        reward=tf.random.uniform(shape, -1.0, 1.0),
+        discount=tf.ones(shape)
+    )
+    dataset_fn = lambda: tf.data.Dataset.from_tensors((experience, ())).repeat()
+    agent_learner = learner.Learner(tempfile.mkdtemp(), train_step, tf_agent, dataset_fn)
+
+    t0 = time.time()
+    agent_learner.run(iterations=1)
+    first_step = time.time() - t0
+    agent_learner.run(iterations=warmup)
+
+    t0 = time.time()
+    agent_learner.run(iterations=iterations)
+    elapsed = time.time() - t0
+
+    return {
+        'config': config._asdict(),
+        'first_step_seconds': first_step,
+        'steps_per_second': iterations / elapsed,
+        'samples_per_second': iterations * config.batch_size / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('configs', type=str, nargs='*', help='agent config json files (default: built-in config)')
+    parser.add_argument('--state-size', type=int, default=1024, help='length of observation vector (default: %(default)s)')
+    parser.add_argument('--iterations', type=int, default=200, help='timed learner steps (default: %(default)s)')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed learner steps after the first one (default: %(default)s)')
+    args = parser.parse_args()
+
+    configs: List[AgentConfig] = [load_config(path) for path in args.configs] or [AgentConfig()]
+    for path, config in zip(args.configs or ['default'], configs):
+        result = benchmark_learner(config, args.state_size, args.iterations, args.warmup)
+        result['name'] = path
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
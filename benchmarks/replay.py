@@ -0,0 +1,102 @@
+""" replay storage benchmark
+
+Writes synthetic duels into a local reverb server with each replay layout and reports
+insert throughput and resident memory per stored transition.
+
+    python -m <package>.benchmarks.replay --chunk-lengths 8 16 32
+"""
+import argparse
+import json
+import time
+from typing import List
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.specs import tensor_spec
+from tf_agents.train.utils import train_utils
+from tf_agents.trajectories.time_step import StepType
+
+from .learner import create_specs
+from ..agent.agent import _create_agent, _create_reverb_server, _create_replay_buffer, _create_rb_observer
+from ..agent.config import AgentConfig
+
+
+def _rss_bytes() -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _synthetic_episode(template, length: int) -> list:
+    """ FIRST, MID..., LAST then the boundary step, with random observations """
+    step_types = [StepType.FIRST] + [StepType.MID] * (length - 2) + [StepType.LAST]
+    next_step_types = [StepType.MID] * (length - 2) + [StepType.LAST, StepType.FIRST]
+    steps = []
+    for step_type, next_step_type in zip(step_types, next_step_types):
+        steps.append(template._replace(
+            step_type=np.asarray(step_type, dtype=np.int32),
+            next_step_type=np.asarray(next_step_type, dtype=np.int32),
+            observation=np.random.rand(*template.observation.shape).astype(np.float32),
+            action=np.random.uniform(-1, 1, template.action.shape).astype(np.float32),
+        ))
+    return steps
+
+
+def benchmark_replay(collect_data_spec, chunk_length: int, episodes: int, episode_length: int) -> dict:
+    table_name = 'benchmark_table'
+    template = tf.nest.map_structure(lambda t: t.numpy(), tensor_spec.sample_spec_nest(collect_data_spec))
+    step_bytes = sum(np.asarray(t).nbytes for t in tf.nest.flatten(template))
+
+    rss0 = _rss_bytes()
+    reverb_server = _create_reverb_server(table_name, chunk_length)
+    replay_buffer = _create_replay_buffer(collect_data_spec, reverb_server, table_name, chunk_length)
+    observer = _create_rb_observer(replay_buffer, table_name, chunk_length)
+    rss1 = _rss_bytes()
+
+    elapsed = 0.0
+    for _ in range(episodes):
+        steps = _synthetic_episode(template, episode_length)
+        t0 = time.time()
+        for step in steps:
+            observer(step)
+        elapsed += time.time() - t0
+    observer.flush()
+    rss2 = _rss_bytes()
+
+    items = replay_buffer.py_client.server_info()[table_name].current_size
+    transitions = episodes * (episode_length - 1)
+    observer.close()
+    reverb_server.stop()
+    return {
+        'chunk_length': chunk_length,
+        'transitions': transitions,
+        'items': items,
+        'step_bytes': step_bytes,
+        'transitions_per_second': transitions / elapsed,
+        'insert_megabytes_per_second': transitions * step_bytes / elapsed / 2**20,
+        'server_bytes': rss1 - rss0,
+        'bytes_per_transition': (rss2 - rss1) / transitions,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunk-lengths', type=int, nargs='*', default=[16], help='chunked layouts to compare with the 2-step layout (default: %(default)s)')
+    parser.add_argument('--state-size', type=int, default=1024, help='length of observation vector (default: %(default)s)')
+    parser.add_argument('--episodes', type=int, default=50, help='episodes to write (default: %(default)s)')
+    parser.add_argument('--episode-length', type=int, default=150, help='steps per episode (default: %(default)s)')
+    args = parser.parse_args()
+
+    observation_spec, action_spec, time_step_spec = create_specs(args.state_size)
+    tf_agent = _create_agent(observation_spec, action_spec, time_step_spec, AgentConfig(), train_utils.create_train_step())
+
+    layouts: List[int] = [None] + args.chunk_lengths
+    for chunk_length in layouts:
+        print(json.dumps(benchmark_replay(tf_agent.collect_data_spec, chunk_length, args.episodes, args.episode_length)))
+
+
+if __name__ == '__main__':
+    main()
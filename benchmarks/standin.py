@@ -0,0 +1,92 @@
+""" local stand-in for the duel server, for benchmarks
+
+StandInClient takes the place of pyygoclient's GameClient: it runs on its own thread and
+drives the real EnvGameExecutor through its callbacks (on_start, select_mainphase_action,
+on_win, on_rematch), so the environment, the executor and the session are the ones used
+against a server.
+"""
+import time
+from threading import Thread
+from typing import List, NamedTuple
+
+import numpy as np
+
+from pyygocore import Duel
+from pyygoclient import GameExecutor
+
+
+class StandInCard(NamedTuple):
+    id: int
+
+
+class StandInDeck(NamedTuple):
+    main: List[int]
+    extra: List[int]
+
+
+class StandInMainPhase(NamedTuple):
+    summonable: List[StandInCard]
+    special_summonable: List[StandInCard]
+    repositionable: List[StandInCard]
+    monster_settable: List[StandInCard]
+    spell_settable: List[StandInCard]
+    activatable: List[StandInCard]
+    activation_descs: List[int]
+    can_battle: bool
+    can_end: bool
+
+
+class StandInClient(Thread):
+    """ plays synthetic duels of main phase decisions against the executor set by set_executor
+
+    mean_duel_length: mean decisions per duel (geometric)
+    step_latency: seconds slept before each decision, standing in for the server
+    """
+    def __init__(self, deck_name: str, host: str, port: int, version: int, name: str,
+                 deck_size: int=40, mean_duel_length: int=150, step_latency: float=0.0, seed: int=0) -> None:
+        super().__init__(name=name, daemon=True)
+        self._executor: GameExecutor = None
+        self._duel: Duel = Duel()
+        self._deck: StandInDeck = StandInDeck(list(range(1, deck_size + 1)), [])
+        self._mean_duel_length: int = mean_duel_length
+        self._step_latency: float = step_latency
+        self._rng: np.random.Generator = np.random.default_rng(seed)
+        self._surrendered: bool = False
+
+
+    def set_executor(self, executor: GameExecutor) -> None:
+        self._executor = executor
+
+
+    def get_duel(self) -> Duel:
+        return self._duel
+
+
+    def get_deck(self) -> StandInDeck:
+        return self._deck
+
+
+    def surrender(self) -> None:
+        self._surrendered = True
+
+
+    def _main_phase(self) -> StandInMainPhase:
+        num_cards: int = int(self._rng.integers(0, 6))
+        cards: List[StandInCard] = [StandInCard(int(card_id)) for card_id in self._rng.choice(self._deck.main, num_cards, replace=False)]
+        return StandInMainPhase(cards, [], [], [], [], [], [], False, True)
+
+
+    def run(self) -> None:
+        while True:
+            self._surrendered = False
+            self._executor.on_start()
+            remaining: int = int(self._rng.geometric(1 / self._mean_duel_length))
+            while remaining > 0 and not self._surrendered:
+                if self._step_latency > 0:
+                    time.sleep(self._step_latency)
+                self._executor.select_mainphase_action(self._main_phase())
+                remaining -= 1
+            win: bool = not self._surrendered and self._rng.random() < 0.5
+            self._executor.on_win(win)
+            if not self._executor.on_rematch(win):
+                return
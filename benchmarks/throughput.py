@@ -0,0 +1,126 @@
+""" end-to-end training throughput benchmark with a regression gate
+
+Runs DuelAgent (SAC agent, reverb server, collect/eval actors) against local stand-in duels
+for a fixed number of train iterations, prints a JSON report and exits with 1 when a metric
+is worse than the baseline by more than the tolerance, or when there is no baseline.
+
+    python -m <package>.benchmarks.throughput --iterations 200
+    python -m <package>.benchmarks.throughput --update-baseline
+"""
+import argparse
+import functools
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+from tf_agents.metrics import py_metrics
+
+from .standin import StandInClient
+from ..agent import DuelAgent, AgentConfig, load_config
+from ..environment import GameSession, YGOEnvironment
+from ..util import error
+
+_default_baseline: str = os.path.join(os.path.dirname(__file__), 'baseline.json')
+_higher_is_better = ('env_steps_per_second', 'learner_steps_per_second')
+_lower_is_better = ('sample_latency_ms', 'time_to_first_train_step_seconds')
+
+
+def _sample_latency_ms(agent: DuelAgent, num_samples: int) -> float:
+    client = agent._reverb_replay_buffer.py_client
+    latencies: List[float] = []
+    samples = client.sample(agent._table_name, num_samples=num_samples)
+    for _ in range(num_samples):
+        t0 = time.time()
+        next(samples)
+        latencies.append((time.time() - t0) * 1000)
+    return float(np.median(latencies))
+
+
+def _standin_session(name: str, deck_size: int, mean_duel_length: int, step_latency: float, seed: int) -> GameSession:
+    client_factory = functools.partial(StandInClient, deck_size=deck_size, mean_duel_length=mean_duel_length, step_latency=step_latency, seed=seed)
+    return GameSession('standin', '', 0, 0, name, client_factory=client_factory)
+
+
+def _env_steps(agent: DuelAgent) -> int:
+    for metric in agent._collect_actor.metrics:
+        if isinstance(metric, py_metrics.EnvironmentSteps):
+            return int(metric.result())
+    raise ValueError('collect actor has no EnvironmentSteps metric')
+
+
+def run_benchmark(config: AgentConfig, iterations: int, deck_size: int, mean_duel_length: int, step_latency: float) -> Dict[str, float]:
+    collect_env = YGOEnvironment('standin', '', 0, 0, 'standin_collect', session=_standin_session('standin_collect', deck_size, mean_duel_length, step_latency, seed=0))
+    eval_env = YGOEnvironment('standin', '', 0, 0, 'standin_eval', session=_standin_session('standin_eval', deck_size, mean_duel_length, step_latency, seed=1))
+
+    t0 = time.time()
+    agent = DuelAgent(collect_env, eval_env, config)
+    setup_seconds = time.time() - t0
+    env_steps_before = _env_steps(agent)
+    agent.train(iterations)
+    env_steps = _env_steps(agent) - env_steps_before
+
+    timings = agent.timings
+    report = {
+        'iterations': iterations,
+        'env_steps': env_steps,
+        'env_steps_per_second': env_steps / timings['collect'],
+        'learner_steps_per_second': (iterations - 1) / max(timings['train'] - timings['first_learner_run'], 1e-9),
+        'sample_latency_ms': _sample_latency_ms(agent, 100),
+        'time_to_first_train_step_seconds': setup_seconds + timings['first_train_step'],
+    }
+    agent.close()
+    collect_env.close()
+    eval_env.close()
+    return report
+
+
+def find_regressions(report: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    regressions: List[str] = []
+    for key in _higher_is_better:
+        if key in baseline and report[key] < baseline[key] * (1 - tolerance):
+            regressions.append(f'{key}: {report[key]:.3f} < baseline {baseline[key]:.3f}')
+    for key in _lower_is_better:
+        if key in baseline and report[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f'{key}: {report[key]:.3f} > baseline {baseline[key]:.3f}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', type=str, help='agent config json file (default: built-in config)')
+    parser.add_argument('--iterations', type=int, default=200, help='train iterations (default: %(default)s)')
+    parser.add_argument('--deck-size', type=int, default=40, help='cards in the stand-in deck, which sets the observation size (default: %(default)s)')
+    parser.add_argument('--duel-length', type=int, default=150, help='mean decisions per duel (default: %(default)s)')
+    parser.add_argument('--step-latency', type=float, default=0.0, help='simulated server latency per decision in seconds (default: %(default)s)')
+    parser.add_argument('--baseline', type=str, default=_default_baseline, help='baseline report (default: %(default)s)')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression (default: %(default)s)')
+    parser.add_argument('--output', type=str, help='also write the report to this file')
+    parser.add_argument('--update-baseline', action='store_true', help='overwrite the baseline with this run')
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config is not None else AgentConfig()
+    report = run_benchmark(config, args.iterations, args.deck_size, args.duel_length, args.step_latency)
+    print(json.dumps(report, indent=4))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        return
+
+    if not os.path.exists(args.baseline):
+        error(f'no baseline at {args.baseline}. record one with --update-baseline')
+
+    with open(args.baseline) as f:
+        baseline: Dict[str, float] = json.load(f)
+    regressions = find_regressions(report, baseline, args.tolerance)
+    if regressions:
+        error('throughput regressed:\n' + '\n'.join(regressions))
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,5 @@
-from .environment import YGOEnvironment
\ No newline at end of file
+from .environment import YGOEnvironment
+from .host import DuelHost, HostedGameExecutor, policy_decide_fn
+from .session import GameSession
+from .shortcut import DecisionShortcut
+from .watchdog import DuelWatchdog
\ No newline at end of file
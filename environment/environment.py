@@ -1,4 +1,4 @@
-
+import time
 
 import numpy as np
 from tf_agents.environments import py_environment
@@ -6,16 +6,25 @@ from tf_agents.specs import array_spec
 from tf_agents.trajectories import time_step as ts
 
 
+from . import executor
 from .executor import EnvGameExecutor
-from pyygoclient import GameClient
+from .session import GameSession
+from .watchdog import DuelWatchdog
 
 
 class YGOEnvironment(py_environment.PyEnvironment):
-    def __init__(self, deck_name: str, host: str, port: int, version: int, name: str) -> None:
-        client: GameClient = GameClient(deck_name, host, port, version, name)
-        self._executor: EnvGameExecutor = EnvGameExecutor(client)
+    def __init__(self, deck_name: str, host: str, port: int, version: int, name: str, session: GameSession=None, shortcut: bool=True,
+                 stall_timeout: float=executor.stall_timeout, setup_timeout: float=executor.setup_timeout) -> None:
+        """ session: use this session instead of connecting with the other arguments
+            shortcut: resolve decisions with a single candidate without stepping the environment
+            stall_timeout, setup_timeout: see GameSession. ignored when session is given
+        """
+        if session is None:
+            session = GameSession(deck_name, host, port, version, name, stall_timeout=stall_timeout, setup_timeout=setup_timeout)
+        self._session: GameSession = session
+        self._session.shortcut.enabled = shortcut
         # env parameters
-        self._action_spec = array_spec.BoundedArraySpec(shape=(), dtype=np.float32, minimum=-1, maximum=1, name='action')
+        self._action_spec = array_spec.BoundedArraySpec(shape=(1,), dtype=np.float32, minimum=-1, maximum=1, name='action')
         self._observation_spec = array_spec.BoundedArraySpec(shape=self._executor.state_shape, dtype=np.float32, name='observation')
         self._episode_ended: bool = False
     
@@ -28,8 +37,31 @@ class YGOEnvironment(py_environment.PyEnvironment):
         return self._observation_spec
 
 
+    @property
+    def session(self) -> GameSession:
+        return self._session
+
+
+    @property
+    def watchdog(self) -> DuelWatchdog:
+        return self._session.watchdog
+
+
+    @property
+    def _executor(self) -> EnvGameExecutor:
+        return self._session.executor
+
+
     def _reset(self) -> ts.TimeStep:
-        state = self._executor.get_state()
+        t0 = time.time()
+        state = None
+        while state is None:
+            self._session.ensure_alive()
+            state = self._executor.get_first_state(self._session.setup_timeout)
+            if state is None and self._executor.is_alive():
+                # connected, but no duel is coming. e.g. the room still hangs on a stalled duel
+                self._session.reconnect(DuelWatchdog.STALL)
+        self._session.record_reset_wait(time.time() - t0)
         self._episode_ended = False
         return ts.restart(state)
 
@@ -38,23 +70,21 @@ class YGOEnvironment(py_environment.PyEnvironment):
         if self._episode_ended:
             return self.reset()
 
-        should_execute = True if action >= 0 else False
+        should_execute = True if action[0] >= 0 else False
         self._executor.execute(should_execute)
 
         state = self._executor.get_state()
         self._episode_ended = self._executor.game_ended()
         reward = self._executor.get_reward()
 
-        if self._episode_ended:
+        if self._episode_ended and self._executor.aborted():
+            # the duel was given up, not lost. don't bootstrap it as a terminal loss
+            return ts.truncation(state, reward)
+        elif self._episode_ended:
             return ts.termination(state, reward)
         else:
             return ts.transition(state, reward=0.0, discount=1.0)
 
     
     def close(self) -> None:
-        self._executor.close()
-        
-
-
-
-
+        self._session.close()
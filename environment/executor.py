@@ -1,23 +1,51 @@
+import functools
 import random
-from threading import Lock, Event
-from typing import List, Tuple
+import time
+import traceback
+from threading import Lock, Event, Semaphore
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
 
 import numpy as np
 
 from .action import Choice, Action, Action_to_int
 from .flags import UsedFlag
 from .preprocess import create_state
+from .shortcut import DecisionShortcut
+from .watchdog import DuelWatchdog
 from pyygocore import Deck, Duel, Card
 from pyygocore.phase import MainPhase, BattlePhase
 from pyygocore.enums import Player
 from pyygoclient import GameExecutor, GameClient
 
 timeout = 10
+stall_timeout = 120 # seconds without a decision or result before a running duel is given up
+setup_timeout = 600 # seconds reset waits for the next duel before reconnecting
+
+T = TypeVar('T')
+def _recover(fallback: Callable[..., T]) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """ abort the duel and answer with fallback instead of killing the client thread """
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(self: 'EnvGameExecutor', *args: Any) -> T:
+            try:
+                return func(self, *args)
+            except Exception:
+                traceback.print_exc()
+                self._abort(DuelWatchdog.CRASH)
+                self._surrender()
+                return fallback(*args)
+        return wrapper
+    return decorator
 
 
 class EnvGameExecutor(GameExecutor):
-    def __init__(self, client: GameClient) -> None:
+    def __init__(self, client: GameClient, watchdog: DuelWatchdog=None, on_setup: Callable[[float], None]=None, shortcut: DecisionShortcut=None, stall_timeout: float=stall_timeout) -> None:
+        """ stall_timeout: seconds the environment waits for the next decision of a running duel before giving it up """
         self._client: GameClient = client
+        self._stall_timeout: float = stall_timeout
+        self.watchdog: DuelWatchdog = watchdog if watchdog is not None else DuelWatchdog()
+        self.shortcut: DecisionShortcut = shortcut if shortcut is not None else DecisionShortcut()
+        self._on_setup: Callable[[float], None] = on_setup
         client.set_executor(self)
         self._duel: Duel = client.get_duel()
         self._deck: Deck = client.get_deck()
@@ -27,30 +55,90 @@ class EnvGameExecutor(GameExecutor):
         self._state: np.ndarray = create_state(Action.END, 0, 0, self._duel, self._usedflag, self._deck_list)
         self.state_shape = self._state.shape
         self._should_execute: bool = False
-        self._state_has_updated: Event = Event()
+        # one release per state or result for the environment to read. an Event would merge the
+        # end of a duel with the first decision of the rematch when the client gets there first
+        self._state_updates: Semaphore = Semaphore(0)
         self._should_execute_has_updated: Event = Event()
 
         self._reward: float = 0.0
         self._reward_lock: Lock = Lock()
         self._game_ended: Event = Event()
+        self._ended_by_abort: bool = False
+        self._aborted: Event = Event()
+        self._surrendered: bool = False
+        self._in_duel: Event = Event()
         self._rematch: Event = Event()
         self._rematch.set()
+        self._setup_started: float = time.time()
         self._client.start()
 
     
     def close(self) -> None:
         self._rematch.clear()
         self._should_execute_has_updated.set()
-        self._state_has_updated.set()
+        self._state_updates.release()
+
+
+    def is_alive(self) -> bool:
+        return self._client.is_alive()
+
+
+    def disconnect(self) -> None:
+        """ give up this connection for good, freeing the room for the next one
+
+        The client thread is no longer answered once this is called, so surrendering from
+        the calling thread cannot interleave with a selection in progress.
+        """
+        self.close()
+        if self.is_alive():
+            try:
+                self._client.surrender()
+            except Exception:
+                traceback.print_exc()
+
+
+    def _wait_for_update(self, limit: float) -> Optional[bool]:
+        """ True once a state or result is released, False after limit seconds, None if the client died """
+        deadline: float = time.time() + limit
+        while not self._state_updates.acquire(timeout=max(min(timeout, deadline - time.time()), 0)):
+            if not self.is_alive():
+                return None
+            if time.time() >= deadline:
+                return False
+        return True
 
 
     def get_state(self) -> np.ndarray:
-        self._state_has_updated.wait(timeout)
-        self._state_has_updated.clear()
+        updated: Optional[bool] = self._wait_for_update(self._stall_timeout)
+        if updated is None:
+            self._abort(DuelWatchdog.CRASH)
+        elif not updated and self._in_duel.is_set():
+            self._abort(DuelWatchdog.STALL)
+        if not updated:
+            self._state_updates.acquire(blocking=False) # released by _abort
         state = self._state.copy()
         return state
 
 
+    def get_first_state(self, limit: float=setup_timeout) -> Optional[np.ndarray]:
+        """ wait up to limit seconds for the first decision of the next duel. None if it did not come or the client died
+
+        The result of the previous episode is cleared here rather than in on_start: the client
+        thread may already be in the next duel before the environment has read it.
+        """
+        deadline: float = time.time() + limit
+        while True:
+            with self._reward_lock:
+                self._reward = 0.0
+                self._ended_by_abort = False
+                self._game_ended.clear()
+            if not self._wait_for_update(deadline - time.time()):
+                return None
+            if self._in_duel.is_set() and not self._game_ended.is_set():
+                return self._state.copy()
+            # left over by an aborted duel, or a duel ended without asking for a decision
+
+
     def execute(self, should_execute: bool) -> None:
         self._should_execute = should_execute
         self._should_execute_has_updated.set()
@@ -66,28 +154,81 @@ class EnvGameExecutor(GameExecutor):
         return reward
 
 
+    def aborted(self) -> bool:
+        """ whether the current episode was ended by _abort rather than by the duel result """
+        with self._reward_lock:
+            return self._ended_by_abort
+
+
+    def _abort(self, event: str) -> None:
+        """ give up the current duel and end the episode with zero reward. the client thread surrenders at its next selection """
+        print(f'duel aborted: {event}')
+        self.watchdog.record(event)
+        self._aborted.set()
+        self._in_duel.clear()
+        with self._reward_lock:
+            self._reward = 0.0
+            self._ended_by_abort = True
+        self._game_ended.set()
+        self._state_updates.release()
+        self._should_execute_has_updated.set()
+
+
+    def _surrender(self) -> None:
+        """ call from the client thread only, it is inside the protocol loop """
+        if self._surrendered:
+            return
+        self._surrendered = True
+        try:
+            self._client.surrender()
+        except Exception:
+            traceback.print_exc()
+
+
     def _block_until_execute_called(self) -> None:
-        self._state_has_updated.set()
+        self._state_updates.release()
         self._should_execute_has_updated.wait(timeout)
         self._should_execute_has_updated.clear()
 
     
     def _select(self, choices: List[Choice]) -> Choice:
+        if self._setup_started is not None:
+            if self._on_setup is not None:
+                self._on_setup(time.time() - self._setup_started)
+            self._setup_started = None
+
         if not self._rematch.is_set():
             self._client.surrender()
-        
-        for choice in choices:
+
+        if self._aborted.is_set():
+            self._surrender()
+            return choices[-1]
+
+        candidates: List[Choice] = self.shortcut.candidates(choices)
+        for asked, choice in enumerate(candidates, 1):
             self._state = create_state(choice.action, choice.card_id, choice.option, self._duel, self._usedflag, self._deck_list)
-            self._block_until_execute_called()
-            if self._should_execute:
+            should_execute: bool = self._decide()
+            if self._aborted.is_set():
+                self._surrender()
+                return choices[-1]
+            if should_execute:
+                self.shortcut.record_select(asked, False)
                 return choice
+        self.shortcut.record_select(len(candidates), len(candidates) < len(choices))
         return choices[-1]
 
+
+    def _decide(self) -> bool:
+        """ whether to take the choice encoded in self._state. answered by the environment """
+        self._block_until_execute_called()
+        return self._should_execute
+
     
     def on_start(self) -> None:
-        with self._reward_lock:
-            self._reward = 0.0
-        self._game_ended.clear()
+        self._aborted.clear()
+        self._surrendered = False
+        self._should_execute_has_updated.clear() # may be left set by _abort
+        self._in_duel.set()
 
     
     def on_new_turn(self) -> None:
@@ -99,10 +240,14 @@ class EnvGameExecutor(GameExecutor):
 
 
     def on_win(self, win: bool) -> None:
+        self._setup_started = time.time()
+        self._in_duel.clear()
+        if self._aborted.is_set():
+            return # the episode has already been ended by _abort
         with self._reward_lock:
             self._reward = 100.0 if win else 0.0
         self._game_ended.set()
-        self._state_has_updated.set()
+        self._state_updates.release()
 
         
     
@@ -194,6 +339,9 @@ class EnvGameExecutor(GameExecutor):
         for index, card in enumerate(cards):
             choices.append(Choice(Action.SELECT, index, card.id, option=hint))
 
+        if self.shortcut.skip_select_all(len(choices), max_):
+            return [choice.index for choice in choices]
+
         num_to_select: int = max_ # ToDo: more intelligent
         selecteds: List[Choice] = []
         for _ in range(max_):
@@ -237,6 +385,7 @@ class EnvGameExecutor(GameExecutor):
         return [choices.index(card) for card in choosed]
     
 
+    @_recover(lambda choices, *_: [0])
     def select_sum(self, choices: List[Tuple[Card, int, int]], sum_value: int, min_: int, max_: int, must_just: bool, select_hint: int) -> List[int]:
         raise Exception('not complete coding')
 
@@ -245,22 +394,27 @@ class EnvGameExecutor(GameExecutor):
         return self.select_card(choices, min_, max_, cancelable, hint)
 
 
+    @_recover(lambda counter_type, quantity, cards, counters: [min(quantity, counters[0])] + [0] * (len(cards) - 1))
     def select_counter(self, counter_type: int, quantity: int, cards: List[Card], counters: List[int]) -> List[int]:
         raise Exception('not complete coding')
 
 
+    @_recover(lambda choices: 0)
     def select_number(self, choices: List[int]) -> int:
         raise Exception('not complete coding')
 
     
+    @_recover(lambda cards: list(range(len(cards))))
     def sort_card(self, cards: List[Card]) -> List[int]:
         raise Exception('not complete coding')
 
 
+    @_recover(lambda choices, count: choices[:count])
     def announce_attr(self, choices: List[int], count: int) -> List[int]:
         raise Exception('not complete coding')
 
 
+    @_recover(lambda choices, count: choices[:count])
     def announce_race(self, choices: List[int], count: int) -> List[int]:
         raise Exception('not complete coding')
 
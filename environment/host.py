@@ -0,0 +1,201 @@
+""" batched inference host: one asyncio event loop answering the decisions of many duels
+
+Connections are not multiplexed. Each duel still runs its GameClient on its own network
+thread, because the protocol lives in pyygoclient, and that thread blocks while its
+decision is pending. What is shared is inference: decisions no longer need a
+YGOEnvironment and a driver thread per duel. HostedGameExecutor submits each decision
+to the host's loop, and the host resolves all pending decisions with one batched call
+of decide_fn.
+"""
+import asyncio
+import concurrent.futures
+import time
+import traceback
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from tf_agents.trajectories import time_step as ts
+
+from .executor import EnvGameExecutor, timeout
+from .watchdog import DuelWatchdog
+from pyygoclient import GameClient
+
+DecideFn = Callable[[np.ndarray], np.ndarray]
+ResultFn = Callable[[Optional[bool]], None]
+
+
+class HostedGameExecutor(EnvGameExecutor):
+    """ executor whose decisions are answered by a DuelHost """
+    def __init__(self, client: GameClient, host: 'DuelHost', on_result: ResultFn=None, on_setup: Callable[[float], None]=None, rematch: bool=True) -> None:
+        """ on_result: called with the result of each duel, None if it was aborted
+            on_setup: called at the first decision of each duel with the seconds since connecting or the previous duel
+            rematch: accept rematches. False plays a single duel
+        """
+        self._host: DuelHost = host
+        self._on_result: ResultFn = on_result
+        self._accept_rematch: bool = rematch
+        super().__init__(client, host.watchdog, on_setup=on_setup)
+
+
+    def _decide(self) -> bool:
+        future: concurrent.futures.Future = self._host.submit(self._state.copy())
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self._abort(DuelWatchdog.STALL)
+            return False
+        except Exception:
+            # decide_fn failed for the whole batch. give up this duel, the host keeps serving
+            self._abort(DuelWatchdog.CRASH)
+            return False
+
+
+    def on_win(self, win: bool) -> None:
+        aborted: bool = self._aborted.is_set()
+        super().on_win(win)
+        if not aborted:
+            self._host.record_result(win)
+        if self._on_result is not None:
+            self._on_result(None if aborted else win)
+
+
+    def on_rematch(self, win_on_match: bool) -> bool:
+        return self._accept_rematch and super().on_rematch(win_on_match)
+
+
+class DuelHost:
+    """ batches the decisions of all hosted duels on one event loop """
+    def __init__(self, decide_fn: DecideFn, max_batch_size: int=64, batch_window: float=0.002) -> None:
+        """ decide_fn: maps a batch of states to a batch of actions. action >= 0 takes the choice
+            batch_window: seconds to wait for more decisions before calling decide_fn with a partial batch
+        """
+        self.watchdog: DuelWatchdog = DuelWatchdog()
+        self._decide_fn: DecideFn = decide_fn
+        self._max_batch_size: int = max_batch_size
+        self._batch_window: float = batch_window
+        self._executors: List[HostedGameExecutor] = []
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self._thread: Thread = Thread(target=self._run, daemon=True)
+        self._ready: Event = Event()
+        self._closed: bool = False
+        self._stats_lock: Lock = Lock()
+        self._stats: Dict[str, float] = {'decisions': 0, 'batches': 0, 'inference_seconds': 0.0, 'duels': 0, 'wins': 0}
+
+
+    def start(self) -> None:
+        self._thread.start()
+        self._ready.wait()
+
+
+    def add_duel(self, client: GameClient, on_result: ResultFn=None, on_setup: Callable[[float], None]=None, rematch: bool=True) -> HostedGameExecutor:
+        """ start client and answer its decisions on this host. see HostedGameExecutor for the arguments """
+        executor = HostedGameExecutor(client, self, on_result, on_setup, rematch)
+        self._executors.append(executor)
+        return executor
+
+
+    def release(self, executor: HostedGameExecutor, disconnect: bool=False) -> None:
+        """ stop answering for executor's client after its current duel, or surrender it now with disconnect """
+        if disconnect:
+            executor.disconnect()
+        else:
+            executor.close()
+        self._executors.remove(executor)
+
+
+    async def decide(self, state: np.ndarray) -> bool:
+        future: asyncio.Future = self._loop.create_future()
+        self._pending.append((state, future))
+        self._has_pending.set()
+        return await future
+
+
+    def submit(self, state: np.ndarray) -> concurrent.futures.Future:
+        """ thread-safe entry of decide for client threads """
+        return asyncio.run_coroutine_threadsafe(self.decide(state), self._loop)
+
+
+    def record_result(self, win: bool) -> None:
+        with self._stats_lock:
+            self._stats['duels'] += 1
+            self._stats['wins'] += int(win)
+
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['mean_batch_size'] = stats['decisions'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve())
+        self._loop.close()
+
+
+    async def _serve(self) -> None:
+        self._has_pending: asyncio.Event = asyncio.Event()
+        self._ready.set()
+        while True:
+            await self._has_pending.wait()
+            if self._closed:
+                break
+            if self._batch_window > 0 and len(self._pending) < self._max_batch_size:
+                await asyncio.sleep(self._batch_window)
+
+            batch = [(state, future) for state, future in self._pending[:self._max_batch_size] if not future.cancelled()]
+            self._pending = self._pending[self._max_batch_size:]
+            if not self._pending:
+                self._has_pending.clear()
+            if not batch:
+                continue
+
+            t0 = time.time()
+            states: np.ndarray = np.stack([state for state, _ in batch])
+            try:
+                actions: np.ndarray = await self._loop.run_in_executor(None, self._decide_fn, states)
+            except Exception as e:
+                traceback.print_exc()
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), action in zip(batch, actions):
+                if not future.done():
+                    future.set_result(bool(action >= 0))
+            with self._stats_lock:
+                self._stats['decisions'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['inference_seconds'] += time.time() - t0
+
+
+    def close(self) -> None:
+        for executor in self._executors:
+            executor.close()
+        if not self._ready.is_set():
+            # never started: no loop is running to stop
+            self._loop.close()
+            return
+        def stop() -> None:
+            self._closed = True
+            self._has_pending.set()
+        self._loop.call_soon_threadsafe(stop)
+        self._thread.join()
+
+
+def policy_decide_fn(policy) -> DecideFn:
+    """ decide_fn of a py policy taking batched time steps, e.g. PyTFEagerPolicy(..., batch_time_steps=False) """
+    def decide(states: np.ndarray) -> np.ndarray:
+        batch_size = states.shape[0]
+        time_step = ts.TimeStep(
+            step_type=np.full((batch_size,), ts.StepType.MID, dtype=np.int32),
+            reward=np.zeros((batch_size,), dtype=np.float32),
+            discount=np.ones((batch_size,), dtype=np.float32),
+            observation=states
+        )
+        return np.asarray(policy.action(time_step).action)
+    return decide
@@ -0,0 +1,103 @@
+import time
+import traceback
+from collections import deque
+from threading import Lock
+from typing import Callable, Deque, Tuple
+
+from . import executor
+from .executor import EnvGameExecutor
+from .shortcut import DecisionShortcut
+from .watchdog import DuelWatchdog
+from pyygoclient import GameClient
+
+_history_size = 100
+
+
+class GameSession:
+    """ keeps one GameClient connected across duels and reconnects it with exponential backoff
+
+    The client thread accepts the rematch on its own, so the next duel can be set
+    up while the learner trains on the previous episode. Whether it is ready in
+    time depends on the server and the opponent; ResetWait measures how long
+    reset still blocks. There is no standby connection: a room is only joined
+    again when the current connection is lost or given up.
+
+    client_factory: called with (deck_name, host, port, version, name) to connect a client
+    stall_timeout: seconds without a decision before a running duel is given up
+    setup_timeout: seconds reset waits for the next duel before reconnecting
+    """
+    def __init__(self, deck_name: str, host: str, port: int, version: int, name: str, backoff: float=1.0, max_backoff: float=60.0,
+                 client_factory: Callable[..., GameClient]=GameClient, stall_timeout: float=executor.stall_timeout, setup_timeout: float=executor.setup_timeout) -> None:
+        self.key: Tuple = (deck_name, host, port, version, name)
+        self.watchdog: DuelWatchdog = DuelWatchdog()
+        self.shortcut: DecisionShortcut = DecisionShortcut()
+        self._backoff: float = backoff
+        self._max_backoff: float = max_backoff
+        self._client_factory: Callable[..., GameClient] = client_factory
+        self._stall_timeout: float = stall_timeout
+        self.setup_timeout: float = setup_timeout
+        self._failures: int = 0
+        self._lock: Lock = Lock()
+        self._setup_latencies: Deque[float] = deque(maxlen=_history_size)
+        self._reset_waits: Deque[float] = deque(maxlen=_history_size)
+        self.executor: EnvGameExecutor = self._connect()
+
+
+    def _connect(self) -> EnvGameExecutor:
+        while True:
+            if self._failures > 0:
+                time.sleep(min(self._backoff * 2 ** (self._failures - 1), self._max_backoff))
+            try:
+                client: GameClient = self._client_factory(*self.key)
+                return EnvGameExecutor(client, self.watchdog, on_setup=self._record_setup, shortcut=self.shortcut, stall_timeout=self._stall_timeout)
+            except Exception: # the client raises its own errors for refused connections and failed handshakes
+                traceback.print_exc()
+                self._failures += 1
+
+
+    def ensure_alive(self) -> None:
+        """ reconnect if the client thread has died. backoff grows until a duel is set up again """
+        if self.executor.is_alive():
+            return
+        self._reconnect()
+
+
+    def reconnect(self, event: str) -> None:
+        """ drop a connection that is alive but no longer sets up duels, recording event as the reason """
+        self.watchdog.record(event)
+        self._reconnect()
+
+
+    def _reconnect(self) -> None:
+        self.executor.disconnect()
+        self._failures += 1
+        self.executor = self._connect()
+        self.watchdog.record(DuelWatchdog.RECONNECT)
+
+
+    def _record_setup(self, latency: float) -> None:
+        with self._lock:
+            self._failures = 0
+            self._setup_latencies.append(latency)
+
+
+    def record_reset_wait(self, wait: float) -> None:
+        with self._lock:
+            self._reset_waits.append(wait)
+
+
+    def mean_setup_latency(self) -> float:
+        """ seconds from the end of a duel (or from connecting) until the first decision of the next """
+        with self._lock:
+            return sum(self._setup_latencies) / len(self._setup_latencies) if self._setup_latencies else 0.0
+
+
+    def mean_reset_wait(self) -> float:
+        """ seconds the environment actually blocked in reset. near zero when the rematch was set up during training """
+        with self._lock:
+            return sum(self._reset_waits) / len(self._reset_waits) if self._reset_waits else 0.0
+
+
+    def close(self) -> None:
+        self.executor.close()
+
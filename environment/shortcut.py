@@ -0,0 +1,59 @@
+from threading import Lock
+from typing import List
+
+from .action import Choice
+
+
+class DecisionShortcut:
+    """ resolves decisions without asking the policy when there is nothing to choose from
+
+    decisions counts the candidates the policy was asked about plus those resolved here
+    """
+    def __init__(self, enabled: bool=True) -> None:
+        self.enabled: bool = enabled
+        self._decisions: int = 0
+        self._skipped: int = 0
+        self._lock: Lock = Lock()
+
+
+    def candidates(self, choices: List[Choice]) -> List[Choice]:
+        """ the choices to ask the policy about, in order. the last one is taken when all others
+            are declined, so asking about it is a wasted step. this covers a single choice too
+        """
+        return choices[:-1] if self.enabled else choices
+
+
+    def record_select(self, asked: int, taken_without_asking: bool) -> None:
+        """ asked: candidates the policy answered before the choice was made """
+        self._count(asked + int(taken_without_asking), int(taken_without_asking))
+
+
+    def skip_select_all(self, num_cards: int, max_: int) -> bool:
+        """ True if every card has to be selected anyway """
+        skip: bool = self.enabled and max_ >= num_cards
+        if skip:
+            self._count(num_cards, num_cards)
+        return skip
+
+
+    def _count(self, decisions: int, skipped: int) -> None:
+        with self._lock:
+            self._decisions += decisions
+            self._skipped += skipped
+
+
+    @property
+    def decisions(self) -> int:
+        with self._lock:
+            return self._decisions
+
+
+    @property
+    def skipped(self) -> int:
+        with self._lock:
+            return self._skipped
+
+
+    def skipped_ratio(self) -> float:
+        with self._lock:
+            return self._skipped / self._decisions if self._decisions else 0.0
@@ -0,0 +1,28 @@
+from threading import Lock
+from typing import Dict
+
+
+class DuelWatchdog:
+    """ counts duels aborted by the executor and the recoveries done by the environment """
+    STALL: str = 'stall'
+    CRASH: str = 'crash'
+    RECONNECT: str = 'reconnect'
+
+    def __init__(self) -> None:
+        self._counts: Dict[str, int] = {self.STALL: 0, self.CRASH: 0, self.RECONNECT: 0}
+        self._lock: Lock = Lock()
+
+
+    def record(self, event: str) -> None:
+        with self._lock:
+            self._counts[event] += 1
+
+
+    def count(self, event: str) -> int:
+        with self._lock:
+            return self._counts[event]
+
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,275 @@
+""" self-play league keeping a pool of local duel slots busy
+
+Every slot is the port of a local duel server room. Each slot runs one duel at a time
+between two league members, picking the pairing with the fewest duels so far, and
+every member answers the decisions of all its duels on one DuelHost. A member with
+`checkpoints` follows a training run: the newest policy checkpoint there is loaded into
+its saved model every `reload_interval` seconds. Other policy members are fixed snapshots.
+
+`results` logs every duel. Each member also gets <results>_<member>.csv with its decided
+duels from its own side, which tests/analyze.py can plot.
+
+    python -m <package>.league --config configs/league.json
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import itertools
+import json
+import os
+import random
+import time
+import traceback
+from threading import Event, Lock, Thread
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from tf_agents.policies.py_tf_eager_policy import SavedModelPyTFEagerPolicy
+
+from .environment import DuelHost, policy_decide_fn
+from .environment.host import DecideFn
+from .util import VERSION
+from pyygoclient import GameClient
+
+_poll_interval: float = 1.0
+_leave_timeout: float = 30.0 # seconds to wait for both clients to leave the room before the slot's next pairing
+
+
+class Member(NamedTuple):
+    name: str
+    deck: str
+    policy: str = None # saved model directory of a tf_agents policy
+    checkpoint: str = None # policy checkpoint loaded into the saved model, for past snapshots
+    checkpoints: str = None # policy checkpoint directory of a training run, reloaded to follow it
+    scripted: str = None # 'random' or 'first' for baselines without a policy
+
+
+class LeagueConfig(NamedTuple):
+    host: str
+    ports: Tuple[int, ...]
+    members: Tuple[Member, ...]
+    duels: int = 1000
+    duel_timeout: float = 1800.0
+    reload_interval: float = 300.0
+    results: str = 'league_results.csv'
+    summary: str = 'league_summary.json'
+
+
+def load_league_config(path: str) -> LeagueConfig:
+    with open(path) as f:
+        values: dict = json.load(f)
+    values['ports'] = tuple(values['ports'])
+    values['members'] = tuple(Member(**member) for member in values['members'])
+    if len(values['members']) < 2:
+        raise ValueError(f'a league needs at least two members: {path}')
+    return LeagueConfig(**values)
+
+
+def _newest_checkpoint(directory: str) -> Optional[str]:
+    """ checkpoints are named policy_checkpoint_<train step, zero padded> """
+    checkpoints: List[str] = sorted(glob.glob(os.path.join(directory, 'policy_checkpoint_*')))
+    return checkpoints[-1] if checkpoints else None
+
+
+def _reloading_decide_fn(policy: SavedModelPyTFEagerPolicy, directory: str, interval: float) -> DecideFn:
+    """ decide_fn of policy, first loading the newest checkpoint in directory if the last check is interval seconds old
+
+    The host calls decide_fn for one batch at a time, so weights never change within a batch.
+    """
+    decide: DecideFn = policy_decide_fn(policy)
+    loaded: Optional[str] = None
+    checked: float = 0.0
+    def reloading_decide(states: np.ndarray) -> np.ndarray:
+        nonlocal loaded, checked
+        if time.time() - checked >= interval:
+            checked = time.time()
+            checkpoint: Optional[str] = _newest_checkpoint(directory)
+            if checkpoint is not None and checkpoint != loaded:
+                try:
+                    policy.update_from_checkpoint(checkpoint)
+                    loaded = checkpoint
+                except Exception:
+                    # e.g. still being written. keep the current weights until the next check
+                    traceback.print_exc()
+        return decide(states)
+    return reloading_decide
+
+
+def _create_decide_fn(member: Member, reload_interval: float) -> DecideFn:
+    if member.scripted == 'random':
+        return lambda states: np.random.uniform(-1, 1, len(states))
+    if member.scripted == 'first':
+        return lambda states: np.ones(len(states))
+    if member.policy is None:
+        raise ValueError(f'member {member.name} needs either policy or scripted')
+    policy = SavedModelPyTFEagerPolicy(member.policy, load_specs_from_pbtxt=True, batch_time_steps=False)
+    if member.checkpoint is not None:
+        policy.update_from_checkpoint(member.checkpoint)
+    if member.checkpoints is not None:
+        return _reloading_decide_fn(policy, member.checkpoints, reload_interval)
+    return policy_decide_fn(policy)
+
+
+class League:
+    def __init__(self, config: LeagueConfig) -> None:
+        self._config: LeagueConfig = config
+        self._hosts: Dict[str, DuelHost] = {member.name: DuelHost(_create_decide_fn(member, config.reload_interval)) for member in config.members}
+        self._played: Dict[Tuple[int, int], int] = {pairing: 0 for pairing in itertools.combinations(range(len(config.members)), 2)}
+        self._scheduled: int = 0
+        self._lock: Lock = Lock()
+        self._results: List[dict] = []
+        self._member_matches: Dict[str, int] = {member.name: 0 for member in config.members}
+        # seconds from the first decision to the result, and connecting or waiting for the opponent
+        self._dueling: Dict[int, float] = {port: 0.0 for port in config.ports}
+        self._setup: Dict[int, float] = {port: 0.0 for port in config.ports}
+        self._started: float = 0.0
+
+
+    def member_results_path(self, member: Member) -> str:
+        root, ext = os.path.splitext(self._config.results)
+        return f'{root}_{member.name}{ext or ".csv"}'
+
+
+    def run(self) -> dict:
+        for host in self._hosts.values():
+            host.start()
+        self._started = time.time()
+        with contextlib.ExitStack() as files:
+            self._writer = csv.DictWriter(files.enter_context(open(self._config.results, 'w', newline='')),
+                                          ['match', 'slot', 'player', 'opponent', 'win', 'setup_seconds', 'seconds'])
+            self._writer.writeheader()
+            self._member_writers: Dict[str, csv.DictWriter] = {}
+            for member in self._config.members:
+                writer = csv.DictWriter(files.enter_context(open(self.member_results_path(member), 'w', newline='')), ['match', 'opponent', 'win'])
+                writer.writeheader()
+                self._member_writers[member.name] = writer
+            slots = [Thread(target=self._run_slot, args=(port,)) for port in self._config.ports]
+            for slot in slots:
+                slot.start()
+            for slot in slots:
+                slot.join()
+        for host in self._hosts.values():
+            host.close()
+
+        summary = self.summary()
+        with open(self._config.summary, 'w') as f:
+            json.dump(summary, f, indent=4)
+        return summary
+
+
+    def _next_pairing(self) -> Optional[Tuple[Member, Member]]:
+        """ the least played pairing, sides in random order. None when all duels are scheduled """
+        with self._lock:
+            if self._scheduled >= self._config.duels:
+                return None
+            self._scheduled += 1
+            fewest: int = min(self._played.values())
+            pairing = random.choice([pairing for pairing, played in self._played.items() if played == fewest])
+            self._played[pairing] += 1
+        player, opponent = (self._config.members[i] for i in random.sample(pairing, 2))
+        return player, opponent
+
+
+    def _run_slot(self, port: int) -> None:
+        while True:
+            pairing = self._next_pairing()
+            if pairing is None:
+                return
+            player, opponent = pairing
+            win, setup_seconds, seconds = self._play(port, player, opponent)
+            with self._lock:
+                self._setup[port] += setup_seconds
+                self._dueling[port] += seconds
+                row = {
+                    'match': len(self._results),
+                    'slot': port,
+                    'player': player.name,
+                    'opponent': opponent.name,
+                    'win': '' if win is None else int(win),
+                    'setup_seconds': round(setup_seconds, 3),
+                    'seconds': round(seconds, 3)
+                }
+                self._results.append(row)
+                self._writer.writerow(row)
+                if win is not None:
+                    for member, rival, won in ((player, opponent, win), (opponent, player, not win)):
+                        self._member_writers[member.name].writerow({'match': self._member_matches[member.name], 'opponent': rival.name, 'win': int(won)})
+                        self._member_matches[member.name] += 1
+
+
+    def _play(self, port: int, player: Member, opponent: Member) -> Tuple[Optional[bool], float, float]:
+        """ (result for player, seconds until the first decision, seconds from then to the result)
+
+        The result is None if the duel was aborted, timed out or lost its connection. A duel
+        given up on is surrendered, and the slot waits for both clients to leave the room.
+        """
+        finished: Event = Event()
+        result: List[Optional[bool]] = [None]
+        first_decisions: List[float] = []
+        def on_result(win: Optional[bool]) -> None:
+            result[0] = win
+            finished.set()
+        def on_setup(latency: float) -> None:
+            first_decisions.append(time.time())
+
+        t0 = time.time()
+        player_host, opponent_host = self._hosts[player.name], self._hosts[opponent.name]
+        player_executor = player_host.add_duel(GameClient(player.deck, self._config.host, port, VERSION, player.name), on_result, on_setup, rematch=False)
+        opponent_executor = opponent_host.add_duel(GameClient(opponent.deck, self._config.host, port, VERSION, opponent.name), on_setup=on_setup, rematch=False)
+        gave_up: bool = False
+        while not finished.wait(_poll_interval):
+            if time.time() - t0 > self._config.duel_timeout:
+                print(f'duel timed out on slot {port}: {player.name} vs {opponent.name}')
+                gave_up = True
+                break
+            if not (player_executor.is_alive() and opponent_executor.is_alive()):
+                # the other side may still be reporting the result
+                if not finished.wait(_poll_interval):
+                    print(f'connection lost on slot {port}: {player.name} vs {opponent.name}')
+                    gave_up = True
+                break
+        ended: float = time.time()
+        player_host.release(player_executor, disconnect=gave_up)
+        opponent_host.release(opponent_executor, disconnect=gave_up)
+        deadline: float = time.time() + _leave_timeout
+        while (player_executor.is_alive() or opponent_executor.is_alive()) and time.time() < deadline:
+            time.sleep(0.1)
+        if player_executor.is_alive() or opponent_executor.is_alive():
+            print(f'clients did not leave slot {port}: {player.name} vs {opponent.name}')
+
+        started: float = min(first_decisions, default=ended)
+        return result[0], started - t0, ended - started
+
+
+    def summary(self) -> dict:
+        with self._lock:
+            elapsed: float = time.time() - self._started
+            standings: Dict[str, Dict[str, int]] = {member.name: {'duels': 0, 'wins': 0, 'aborted': 0} for member in self._config.members}
+            for row in self._results:
+                for name, won in ((row['player'], row['win']), (row['opponent'], '' if row['win'] == '' else 1 - row['win'])):
+                    standings[name]['duels'] += 1
+                    if won == '':
+                        standings[name]['aborted'] += 1
+                    else:
+                        standings[name]['wins'] += won
+            return {
+                'duels': len(self._results),
+                'duels_per_hour': len(self._results) / elapsed * 3600 if elapsed > 0 else 0.0,
+                'standings': standings,
+                # share of wall time each slot spent in duels, and connecting or waiting for the opponent
+                'slot_utilization': {str(port): seconds / elapsed if elapsed > 0 else 0.0 for port, seconds in self._dueling.items()},
+                'slot_setup_share': {str(port): seconds / elapsed if elapsed > 0 else 0.0 for port, seconds in self._setup.items()},
+            }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', type=str, help='league config json file', required=True)
+    args: argparse.Namespace = parser.parse_args()
+    summary = League(load_league_config(args.config)).run()
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+""" on-demand profiling of a running process
+
+Send SIGUSR1 or create the control file to capture, for a limited time,
+- sampled call stacks of every thread (network, executor, learner, ...)
+- a tracemalloc diff of the allocations made meanwhile
+- optionally a TensorFlow profiler trace
+Nothing runs while idle except the control file check every poll_interval seconds.
+"""
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Counter, Dict, Tuple
+
+Frame = Tuple[str, int, str]
+
+
+class ProfileTrigger:
+    def __init__(self, output_dir: str, duration: float=30.0, control_file: str=None, poll_interval: float=5.0, sample_interval: float=0.01, tf_trace: bool=False) -> None:
+        """ control_file: path watched for a capture request. it may contain the duration in seconds """
+        self._output_dir: str = output_dir
+        self._duration: float = duration
+        self._control_file: str = control_file
+        self._poll_interval: float = poll_interval
+        self._sample_interval: float = sample_interval
+        self._tf_trace: bool = tf_trace
+        self._capturing: threading.Lock = threading.Lock()
+
+
+    def install(self) -> None:
+        """ call from the main thread """
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.trigger())
+        if self._control_file is not None:
+            threading.Thread(target=self._watch_control_file, name='profile-trigger', daemon=True).start()
+
+
+    def trigger(self, duration: float=None) -> bool:
+        """ start a capture in the background. False if one is already running """
+        if not self._capturing.acquire(blocking=False):
+            return False
+        duration = duration if duration is not None else self._duration
+        threading.Thread(target=self._capture, args=(duration,), name='profile-capture', daemon=True).start()
+        return True
+
+
+    def _watch_control_file(self) -> None:
+        while True:
+            time.sleep(self._poll_interval)
+            if not os.path.exists(self._control_file):
+                continue
+            try:
+                with open(self._control_file) as f:
+                    content = f.read().strip()
+                os.remove(self._control_file)
+                self.trigger(float(content) if content else None)
+            except (OSError, ValueError) as e:
+                print(f'profile trigger: {e}')
+
+
+    def _capture(self, duration: float) -> None:
+        # leave tracing that was running before the capture alone
+        started_tracemalloc: bool = False
+        tf_profiler = None
+        try:
+            output_dir = os.path.join(self._output_dir, time.strftime('%Y%m%d-%H%M%S'))
+            os.makedirs(output_dir, exist_ok=True)
+            print(f'profiling for {duration}[s] into {output_dir}')
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracemalloc = True
+            before = tracemalloc.take_snapshot()
+            if self._tf_trace:
+                import tensorflow as tf
+                tf.profiler.experimental.start(output_dir)
+                tf_profiler = tf.profiler.experimental
+
+            stacks, samples = self._sample_stacks(duration)
+
+            if tf_profiler is not None:
+                tf_profiler.stop()
+                tf_profiler = None
+            after = tracemalloc.take_snapshot()
+
+            _write_stacks(os.path.join(output_dir, 'stacks.folded'), stacks)
+            _write_thread_samples(os.path.join(output_dir, 'thread_samples.txt'), stacks, samples)
+            with open(os.path.join(output_dir, 'memory_diff.txt'), 'w') as f:
+                for stat in after.compare_to(before, 'lineno')[:50]:
+                    f.write(f'{stat}\n')
+            print(f'profile written to {output_dir}')
+        finally:
+            if tf_profiler is not None:
+                try:
+                    tf_profiler.stop()
+                except Exception as e:
+                    print(f'profile trigger: {e}')
+            if started_tracemalloc:
+                tracemalloc.stop()
+            self._capturing.release()
+
+
+    def _sample_stacks(self, duration: float) -> Tuple[Counter[Tuple[str, Tuple[Frame, ...]]], int]:
+        """ count (thread name, call stack) over periodic samples of all other threads """
+        stacks: Counter[Tuple[str, Tuple[Frame, ...]]] = collections.Counter()
+        own: int = threading.get_ident()
+        samples: int = 0
+        deadline: float = time.time() + duration
+        while time.time() < deadline:
+            names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+                    frame = frame.f_back
+                stacks[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+            samples += 1
+            time.sleep(self._sample_interval)
+        return stacks, samples
+
+
+def _write_stacks(path: str, stacks: Counter[Tuple[str, Tuple[Frame, ...]]]) -> None:
+    """ collapsed stack format readable by flamegraph.pl and speedscope """
+    with open(path, 'w') as f:
+        for (thread_name, stack), count in stacks.most_common():
+            frames = ';'.join(f'{name} ({os.path.basename(filename)}:{line})' for filename, line, name in stack)
+            f.write(f'{thread_name};{frames} {count}\n')
+
+
+def _write_thread_samples(path: str, stacks: Counter[Tuple[str, Tuple[Frame, ...]]], samples: int) -> None:
+    """ share of wall-clock samples each function was on top of the stack (self) or anywhere on it (total), per thread
+
+    Samples are taken whether or not a thread is running, so a thread blocked in a wait or
+    in native code shows that frame as self time. This is not CPU time.
+    """
+    per_thread: Dict[str, Tuple[Counter[str], Counter[str]]] = {}
+    for (thread_name, stack), count in stacks.items():
+        self_counts, total_counts = per_thread.setdefault(thread_name, (collections.Counter(), collections.Counter()))
+        if stack:
+            filename, _, name = stack[-1]
+            self_counts[f'{name} ({filename})'] += count
+        for function in {f'{name} ({filename})' for filename, _, name in stack}:
+            total_counts[function] += count
+
+    with open(path, 'w') as f:
+        f.write(f'{samples} wall-clock samples, idle threads included\n')
+        for thread_name, (self_counts, total_counts) in sorted(per_thread.items()):
+            f.write(f'\n[{thread_name}]\n{"self":>7} {"total":>7}  function\n')
+            for function, total in total_counts.most_common(30):
+                f.write(f'{self_counts[function] / samples:7.1%} {total / samples:7.1%}  {function}\n')
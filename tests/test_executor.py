@@ -0,0 +1,71 @@
+from threading import Event
+
+import numpy as np
+
+from ..benchmarks.standin import StandInClient
+from ..environment.environment import YGOEnvironment
+from ..environment.session import GameSession
+from ..environment.watchdog import DuelWatchdog
+
+_first_action = np.array([1.0], dtype=np.float32)
+
+
+class _HangingClient(StandInClient):
+    """ stops answering after hang_after decisions of its first duel, but stays connected until it is surrendered """
+    def __init__(self, *args, hang_after: int, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._hang_after: int = hang_after
+        self._released: Event = Event()
+
+
+    def surrender(self) -> None:
+        super().surrender()
+        self._released.set()
+
+
+    def run(self) -> None:
+        self._executor.on_start()
+        for _ in range(self._hang_after):
+            self._executor.select_mainphase_action(self._main_phase())
+        self._released.wait()
+
+
+def _session(clients: list) -> GameSession:
+    """ a session connecting the given clients in order, then stand-ins """
+    def connect(*args):
+        return clients.pop(0)(*args) if clients else StandInClient(*args, mean_duel_length=5)
+    return GameSession('standin', 'localhost', 0, 0, 'test', backoff=0.0, client_factory=connect, stall_timeout=0.5, setup_timeout=1.0)
+
+
+def test_episodes_follow_the_duels():
+    env = YGOEnvironment('standin', 'localhost', 0, 0, 'test', session=_session([]), shortcut=False)
+    episodes = 0
+    time_step = env.reset()
+    for _ in range(500):
+        time_step = env.step(_first_action)
+        episodes += int(time_step.is_last())
+    env.close()
+    assert episodes > 0
+    assert env._session.watchdog.counts() == {DuelWatchdog.STALL: 0, DuelWatchdog.CRASH: 0, DuelWatchdog.RECONNECT: 0}
+
+
+def test_stalled_duel_is_truncated_and_reconnected():
+    hanging = []
+    def connect_hanging(*args):
+        hanging.append(_HangingClient(*args, hang_after=3))
+        return hanging[-1]
+    session = _session([connect_hanging])
+    env = YGOEnvironment('standin', 'localhost', 0, 0, 'test', session=session, shortcut=False)
+    env.reset()
+    time_steps = [env.step(_first_action) for _ in range(3)]
+    assert time_steps[-1].is_last()
+    assert time_steps[-1].discount > 0 # truncated, not lost
+
+    # the hanging client is still connected, so reset has to give up on it and reconnect
+    time_step = env.step(_first_action)
+    assert time_step.is_first()
+    hanging[0].join(timeout=1.0)
+    assert not hanging[0].is_alive()
+    assert session.watchdog.count(DuelWatchdog.STALL) == 2
+    assert session.watchdog.count(DuelWatchdog.RECONNECT) == 1
+    env.close()
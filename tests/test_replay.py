@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import reverb
+import tensorflow as tf
+from tf_agents.replay_buffers.reverb_replay_buffer import ReverbReplayBuffer
+from tf_agents.trajectories import trajectory
+from tf_agents.trajectories.time_step import StepType
+
+from ..agent.agent import _create_rb_observer, _create_experience_dataset
+
+_table_name = 'experience'
+_episode_length = 150
+_terminal_reward = 100.0
+
+
+def _collect_data_spec() -> trajectory.Trajectory:
+    return trajectory.Trajectory(
+        step_type=tf.TensorSpec((), tf.int32, 'step_type'),
+        observation=tf.TensorSpec((1,), tf.float32, 'observation'),
+        action=tf.TensorSpec((), tf.float32, 'action'),
+        policy_info=(),
+        next_step_type=tf.TensorSpec((), tf.int32, 'step_type'),
+        reward=tf.TensorSpec((), tf.float32, 'reward'),
+        discount=tf.TensorSpec((), tf.float32, 'discount')
+    )
+
+
+def _episode(length: int) -> list:
+    """ trajectories of an episode with `length` time steps, as an actor writes them. the observation is the step index """
+    step_types = [StepType.FIRST] + [StepType.MID] * (length - 2) + [StepType.LAST, StepType.FIRST]
+    trajectories = []
+    for i in range(length):
+        trajectories.append(trajectory.Trajectory(
+            step_type=np.int32(step_types[i]),
+            observation=np.array([i], dtype=np.float32),
+            action=np.float32(0.0),
+            policy_info=(),
+            next_step_type=np.int32(step_types[i+1]),
+            reward=np.float32(_terminal_reward if step_types[i+1] == StepType.LAST else 0.0),
+            discount=np.float32(0.0 if step_types[i+1] == StepType.LAST else 1.0)
+        ))
+    return trajectories
+
+
+@pytest.mark.parametrize('chunk_length', [2, 16, 64, _episode_length - 1, _episode_length, 200])
+def test_every_transition_is_sampled_once(chunk_length):
+    server = reverb.Server([reverb.Table.queue(_table_name, max_size=1000)])
+    try:
+        replay_buffer = ReverbReplayBuffer(
+            _collect_data_spec(),
+            sequence_length=chunk_length,
+            table_name=_table_name,
+            local_server=server,
+            rate_limiter_timeout_ms=500 # end the dataset once the queue is drained
+        )
+        observer = _create_rb_observer(replay_buffer, _table_name, chunk_length)
+        for step in _episode(_episode_length):
+            observer(step)
+        observer.flush()
+        observer.close()
+
+        indices, rewards, next_step_types = [], [], []
+        for experience, _ in _create_experience_dataset(replay_buffer, 1, chunk_length):
+            indices.append(int(experience.observation[0, 0, 0]))
+            rewards.append(float(experience.reward[0, 0]))
+            next_step_types.append(int(experience.next_step_type[0, 0]))
+
+        assert sorted(indices) == list(range(_episode_length - 1))
+        terminal = indices.index(_episode_length - 2)
+        assert next_step_types[terminal] == StepType.LAST
+        assert rewards[terminal] == _terminal_reward
+    finally:
+        server.stop()
@@ -0,0 +1,51 @@
+import os
+from multiprocessing import resource_tracker
+
+import numpy as np
+import tensorflow as tf
+
+from ..agent.weights import WeightPublisher, WeightSubscriber
+
+
+def _variables(seed: int):
+    rng = np.random.default_rng(seed)
+    return [
+        tf.Variable(rng.standard_normal((3, 4)).astype(np.float32)),
+        tf.Variable(rng.standard_normal((4,)).astype(np.float32)),
+        tf.Variable(np.float32(rng.standard_normal())),
+    ]
+
+
+def test_publish_subscribe_round_trip():
+    learner_variables = _variables(0)
+    collector_variables = _variables(1)
+    publisher = WeightPublisher(f'test_weights_{os.getpid()}', learner_variables)
+    subscriber = WeightSubscriber(f'test_weights_{os.getpid()}', collector_variables)
+    # both ends live in this process, and the subscriber unregistered the segment the publisher unlinks on close
+    resource_tracker.register(publisher._shm._name, 'shared_memory')
+    try:
+        assert not subscriber.update() # nothing published yet
+        assert subscriber.version == -1
+
+        publisher.publish(10)
+        assert subscriber.latest_version == 10
+        assert subscriber.policy_lag() == 10
+        assert subscriber.update()
+        assert subscriber.version == 10
+        assert subscriber.policy_lag() == 0
+        for learner_variable, collector_variable in zip(learner_variables, collector_variables):
+            np.testing.assert_array_equal(collector_variable.numpy(), learner_variable.numpy())
+        assert not subscriber.update() # same version again
+
+        for variable in learner_variables:
+            variable.assign_add(tf.ones_like(variable))
+        publisher.publish(25)
+        assert subscriber.policy_lag() == 15
+        assert subscriber.update()
+        assert subscriber.version == 25
+        assert subscriber.policy_lag() == 0
+        for learner_variable, collector_variable in zip(learner_variables, collector_variables):
+            np.testing.assert_array_equal(collector_variable.numpy(), learner_variable.numpy())
+    finally:
+        subscriber.close()
+        publisher.close()
@@ -10,19 +10,31 @@ class LaunchInfo(NamedTuple):
     port: int
     version: int
     notrain: bool
+    config: str
+    shortcut: bool
+    profile_file: str
+    profile_tf: bool
+    stall_timeout: float
+    setup_timeout: float
 
 
 def load_args() -> LaunchInfo:
     parser = argparse.ArgumentParser()
-    parser.set_defaults(name='AI', host='127.0.0.1', port=7911, version=VERSION, notrain=False)
+    parser.set_defaults(name='AI', host='127.0.0.1', port=7911, version=VERSION, notrain=False, config=None, shortcut=True, profile_file=None, profile_tf=False, stall_timeout=120.0, setup_timeout=600.0)
     parser.add_argument('--name', type=str, help="AI's name (default: %(default)s)")
     parser.add_argument('--deck', type=str, help='deck name', required=True)
     parser.add_argument('--host', type=str, help='host adress (default: %(default)s)')
     parser.add_argument('--port', type=int, help='port (default: %(default)s)')
     parser.add_argument('--version', type=int, help='version (default: %(default)s)')
     parser.add_argument('--notrain', action='store_true', help='no train mode (default: %(default)s)')
+    parser.add_argument('--config', type=str, help='agent config json file (default: %(default)s)')
+    parser.add_argument('--no-shortcut', dest='shortcut', action='store_false', help='ask the policy even when there is a single choice')
+    parser.add_argument('--profile-file', type=str, help='control file that triggers profiling when created, in addition to SIGUSR1 (default: %(default)s)')
+    parser.add_argument('--profile-tf', action='store_true', help='include a TensorFlow profiler trace in profiles (default: %(default)s)')
+    parser.add_argument('--stall-timeout', type=float, help='seconds without a decision before a running duel is given up (default: %(default)s)')
+    parser.add_argument('--setup-timeout', type=float, help='seconds to wait for the next duel before reconnecting (default: %(default)s)')
     args: argparse.Namespace = parser.parse_args()
-    return LaunchInfo(args.name, args.deck, args.host, args.port, args.version, args.notrain)
+    return LaunchInfo(args.name, args.deck, args.host, args.port, args.version, args.notrain, args.config, args.shortcut, args.profile_file, args.profile_tf, args.stall_timeout, args.setup_timeout)
 
 
 def error(message: str, exit_code: int=1) -> None: